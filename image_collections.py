@@ -1,11 +1,25 @@
 import os
 import json
+from bisect import bisect_left, bisect_right
 from typing import Dict, List, Optional, Tuple
-from PyQt5.QtGui import QColor
 
 class ImageCollection:
     """Class to represent a collection of related SEM images with containment relationships"""
     
+    # Distinct RGBA colors for the bounding boxes of high-mag images
+    BOX_COLORS = (
+        (255, 0, 0, 180),    # Red
+        (0, 255, 0, 180),    # Green
+        (0, 0, 255, 180),    # Blue
+        (255, 255, 0, 180),  # Yellow
+        (255, 0, 255, 180),  # Magenta
+        (0, 255, 255, 180),  # Cyan
+        (255, 128, 0, 180),  # Orange
+        (128, 0, 255, 180),  # Purple
+        (0, 128, 0, 180),    # Dark Green
+        (128, 128, 255, 180) # Light Blue
+    )
+    
     def __init__(self, name: str, session_id: str, sample_id: str):
         self.name = name
         self.session_id = session_id
@@ -41,30 +55,9 @@ class ImageCollection:
         for contained_images in self.containment.values():
             high_mag_images.update(contained_images)
         
-        # Create a set of distinct colors
-        colors = [
-            QColor(255, 0, 0, 180),    # Red
-            QColor(0, 255, 0, 180),    # Green
-            QColor(0, 0, 255, 180),    # Blue
-            QColor(255, 255, 0, 180),  # Yellow
-            QColor(255, 0, 255, 180),  # Magenta
-            QColor(0, 255, 255, 180),  # Cyan
-            QColor(255, 128, 0, 180),  # Orange
-            QColor(128, 0, 255, 180),  # Purple
-            QColor(0, 128, 0, 180),    # Dark Green
-            QColor(128, 128, 255, 180) # Light Blue
-        ]
-        
-        # Assign colors to high-mag images
+        # Assign colors to high-mag images, stored as RGBA tuples for serialization
         for i, image in enumerate(high_mag_images):
-            color_index = i % len(colors)
-            # Store color as RGBA tuple for serialization
-            self.colors[image] = (
-                colors[color_index].red(),
-                colors[color_index].green(),
-                colors[color_index].blue(),
-                colors[color_index].alpha()
-            )
+            self.colors[image] = self.BOX_COLORS[i % len(self.BOX_COLORS)]
     
     def to_dict(self) -> dict:
         """Convert collection to dictionary for serialization"""
@@ -115,9 +108,10 @@ class CollectionManager:
         filename = f"{collection.session_id}_{collection.sample_id}_{collection.name.replace(' ', '_')}.json"
         file_path = os.path.join(self.storage_dir, filename)
         
-        # Convert to dictionary and save as JSON
+        # Serialize before opening so a failure can't truncate the file
+        data = json.dumps(collection.to_dict(), indent=2)
         with open(file_path, 'w') as f:
-            json.dump(collection.to_dict(), f, indent=2)
+            f.write(data)
         
         return file_path
     
@@ -137,10 +131,13 @@ class CollectionManager:
     def get_collections_for_session(self, session_id: str) -> List[str]:
         """Get list of collection file paths for a specific session"""
         collection_files = []
+        prefix = f"{session_id}_"
         
-        for filename in os.listdir(self.storage_dir):
-            if filename.startswith(f"{session_id}_") and filename.endswith(".json"):
-                collection_files.append(os.path.join(self.storage_dir, filename))
+        # DirEntry.path is already joined with the storage directory
+        with os.scandir(self.storage_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix) and entry.name.endswith(".json"):
+                    collection_files.append(entry.path)
         
         return collection_files
     
@@ -250,65 +247,58 @@ class CollectionManager:
         sorted_images = sorted(image_metadata.keys(), 
                               key=lambda x: image_metadata[x].get("Mag(pol)", 0))
         
-        # For each low-mag image, check which high-mag images it contains
-        for i, low_mag_img in enumerate(sorted_images):
-            low_mag_meta = image_metadata[low_mag_img]
-            
-            # Skip if missing required fields
-            if not all(k in low_mag_meta for k in ["field_of_view_width", "field_of_view_height", 
-                                                  "sample_position_x", "sample_position_y"]):
+        # Compute each image's FOV rectangle once, instead of once per pair:
+        # (path, x_min, x_max, y_min, y_max, margin_x, margin_y).
+        # Images missing any of the required fields are skipped entirely
+        required_fields = ("field_of_view_width", "field_of_view_height", 
+                           "sample_position_x", "sample_position_y")
+        fovs = []
+        for image_path in sorted_images:
+            meta = image_metadata[image_path]
+            if not all(k in meta for k in required_fields):
                 continue
             
-            # Get field of view and position for low-mag image
-            low_fov_w = low_mag_meta["field_of_view_width"]
-            low_fov_h = low_mag_meta["field_of_view_height"]
-            low_x = low_mag_meta["sample_position_x"]
-            low_y = low_mag_meta["sample_position_y"]
+            fov_w = meta["field_of_view_width"]
+            fov_h = meta["field_of_view_height"]
+            x = meta["sample_position_x"]
+            y = meta["sample_position_y"]
             
-            # Check all higher magnification images
-            contained_images = []
-            for high_mag_img in sorted_images[i+1:]:
-                high_mag_meta = image_metadata[high_mag_img]
-                
-                # Skip if missing required fields
-                if not all(k in high_mag_meta for k in ["field_of_view_width", "field_of_view_height", 
-                                                       "sample_position_x", "sample_position_y"]):
+            # Allow a small margin (5% of the FOV) when this image is the low mag one
+            fovs.append((image_path, x - fov_w/2, x + fov_w/2, y - fov_h/2, y + fov_h/2,
+                         fov_w * 0.05, fov_h * 0.05))
+        
+        # Index the images by the left edge of their FOV, so each low-mag image
+        # only tests the images whose left edge falls within its own X range
+        # rather than every higher magnification image
+        by_x_min = sorted(range(len(fovs)), key=lambda j: fovs[j][1])
+        x_mins = [fovs[j][1] for j in by_x_min]
+        
+        # For each low-mag image, check which high-mag images it contains
+        for i, (low_mag_img, low_x_min, low_x_max, low_y_min, low_y_max, margin_x, margin_y) in enumerate(fovs):
+            # Bounds a higher magnification FOV must lie strictly inside
+            outer_x_min = low_x_min - margin_x
+            outer_x_max = low_x_max + margin_x
+            outer_y_min = low_y_min - margin_y
+            outer_y_max = low_y_max + margin_y
+            
+            # A contained FOV starts inside (outer_x_min, outer_x_max)
+            start = bisect_right(x_mins, outer_x_min)
+            end = bisect_left(x_mins, outer_x_max)
+            
+            contained = []
+            for j in by_x_min[start:end]:
+                # Only higher magnification images can be contained
+                if j <= i:
                     continue
-                
-                # Get field of view and position for high-mag image
-                high_fov_w = high_mag_meta["field_of_view_width"]
-                high_fov_h = high_mag_meta["field_of_view_height"]
-                high_x = high_mag_meta["sample_position_x"]
-                high_y = high_mag_meta["sample_position_y"]
-                
-                # Check if high-mag image is fully contained in low-mag image
-                # For X axis
-                low_mag_x_min = low_x - low_fov_w/2
-                low_mag_x_max = low_x + low_fov_w/2
-                high_mag_x_min = high_x - high_fov_w/2
-                high_mag_x_max = high_x + high_fov_w/2
-                
-                # For Y axis
-                low_mag_y_min = low_y - low_fov_h/2
-                low_mag_y_max = low_y + low_fov_h/2
-                high_mag_y_min = high_y - high_fov_h/2
-                high_mag_y_max = high_y + high_fov_h/2
-                
-                # Allow a small margin (5% of the low mag FOV)
-                margin_x = low_fov_w * 0.05
-                margin_y = low_fov_h * 0.05
-                
-                # Check if high mag FOV is inside low mag FOV (with margin)
-                x_contained = ((low_mag_x_min - margin_x) < high_mag_x_min and 
-                              (low_mag_x_max + margin_x) > high_mag_x_max)
-                y_contained = ((low_mag_y_min - margin_y) < high_mag_y_min and 
-                              (low_mag_y_max + margin_y) > high_mag_y_max)
-                
-                if x_contained and y_contained:
-                    contained_images.append(high_mag_img)
+                _, _, high_x_max, high_y_min, high_y_max, _, _ = fovs[j]
+                if (outer_x_max > high_x_max and
+                        outer_y_min < high_y_min and outer_y_max > high_y_max):
+                    contained.append(j)
             
-            if contained_images:
-                containment_map[low_mag_img] = contained_images
+            if contained:
+                # Report contained images from low to high magnification
+                contained.sort()
+                containment_map[low_mag_img] = [fovs[j][0] for j in contained]
         
         return containment_map
     
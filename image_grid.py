@@ -1,38 +1,114 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QGridLayout,
                            QPushButton, QScrollArea, QComboBox, QCheckBox, QSizePolicy,
-                           QFrame, QGroupBox, QRadioButton)
-from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QImage
-from PyQt5.QtCore import Qt, QRect, QSize, pyqtSignal, QRectF, QPoint
-from PIL import Image, ImageQt
+                           QGroupBox, QRadioButton)
+from PyQt5.QtGui import QPixmap, QPixmapCache, QPainter, QPen, QColor, QImage, QImageReader
+from PyQt5.QtCore import (Qt, QRect, QSize, pyqtSignal, QRectF, QTimer,
+                          QObject, QRunnable, QThreadPool)
 import os
+import logging
+
+log = logging.getLogger(__name__)
+
+class ImageLoadSignals(QObject):
+    """Signals emitted by an ImageLoadTask"""
+    
+    loaded = pyqtSignal(str, QImage)  # Emitted with the image path and decoded image
+
+
+class ImageLoadTask(QRunnable):
+    """Task to decode an image file on a QThreadPool worker thread
+    
+    QPixmap can only be used on the GUI thread, so the image is decoded to a
+    QImage (at most max_size) and handed back via a signal.
+    """
+    
+    def __init__(self, image_path: str, max_size: QSize):
+        super().__init__()
+        self.image_path = image_path
+        self.max_size = max_size
+        self.signals = ImageLoadSignals()
+    
+    def run(self) -> None:
+        """Decode the image and emit the result"""
+        image = self.decode(self.image_path, self.max_size)
+        if not image.isNull():
+            self.signals.loaded.emit(self.image_path, image)
+    
+    @staticmethod
+    def decode(image_path: str, max_size: QSize) -> QImage:
+        """Decode an image to at most max_size; returns a null QImage on failure"""
+        reader = QImageReader(image_path)
+        
+        # Ask the reader for the target size up front, so formats that support
+        # scaled decoding never hold the full-resolution image in memory
+        size = reader.size()
+        if size.width() > max_size.width() or size.height() > max_size.height():
+            reader.setScaledSize(size.scaled(max_size, Qt.KeepAspectRatio))
+        
+        image = reader.read()
+        if image.isNull():
+            log.warning("Could not load image %s: %s", image_path, reader.errorString())
+            return image
+        
+        # Formats that cannot report their size before decoding still get capped
+        if image.width() > max_size.width() or image.height() > max_size.height():
+            image = image.scaled(max_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        
+        # SEM images are usually 8-bit grayscale; convert them once, on the
+        # decoding thread, to the 32-bit formats the pixmap and smooth scaling
+        # use, so neither has to convert the pixel data again
+        if image.hasAlphaChannel():
+            return image.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        return image.convertToFormat(QImage.Format_RGB32)
+
 
 class ImageWidget(QWidget):
     """Widget to display a single image with metadata, bounding boxes, and borders"""
     
     boxDrawn = pyqtSignal(QRectF)  # Signal emitted when user draws a box
     
+    # Largest pixmap kept in memory; larger images are downscaled once on load
+    MAX_PIXMAP_SIZE = QSize(2048, 2048)
+    
+    # Number of cells per side of the grid used to look up tooltips under the mouse
+    TOOLTIP_GRID_SIZE = 8
+    
+    # Immutable per-widget defaults live on the class; instances only get
+    # their own attribute once a value is changed
+    pixmap = None
+    scaled_pixmap = None
+    image_path = None
+    _scaled_cache_key = None  # (pixmap cacheKey, width, height, pixel ratio, fast) of scaled_pixmap
+    _use_fast = False         # Use fast scaling while the widget is being resized
+    render_scale = None       # Device pixel ratio to render at instead of the screen's (for export)
+    _box_pixel_groups = None  # Cached (color, widget-space QRects) groups for boxes
+    _box_pixel_key = None     # (x, y, width, height) of the image they were computed for
+    metadata_text = ""
+    show_metadata = True
+    border_color = None       # Border color for this image
+    show_boxes = True         # Whether to show bounding boxes
+    line_style = Qt.SolidLine # Line style for bounding boxes
+    
+    # For drawing mode
+    drawing = False
+    draw_start_pos = None
+    current_rect = None
+    drawing_enabled = False
+    
+    # For tooltips
+    tooltip_rect = None
+    tooltip_text = None
+    
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.pixmap = None
-        self.scaled_pixmap = None
-        self.metadata_text = ""
-        self.show_metadata = True
-        self.bounding_boxes = []  # List of (x1,y1,x2,y2) normalized coordinates
-        self.box_colors = []      # List of QColor objects for each box
-        self.box_tooltips = []    # List of (rect, tooltip_text) pairs
-        self.border_color = None  # Border color for this image
-        self.show_boxes = True    # Whether to show bounding boxes
-        self.line_style = Qt.SolidLine  # Line style for bounding boxes
-        
-        # For drawing mode
-        self.drawing = False
-        self.draw_start_pos = None
-        self.current_rect = None
-        self.drawing_enabled = False
+        # Mutable state must be per-instance
+        self.boxes = []  # List of ((x1,y1,x2,y2) normalized coordinates, QColor, tooltip) tuples
+        self.tooltip_grid = [[] for _ in range(self.TOOLTIP_GRID_SIZE ** 2)]  # (rect, tooltip) pairs bucketed by cell
         
-        # For tooltips
-        self.tooltip_rect = None
-        self.tooltip_text = None
+        # Re-render with smooth scaling once resizing has settled
+        self._smooth_timer = QTimer(self)
+        self._smooth_timer.setSingleShot(True)
+        self._smooth_timer.timeout.connect(self._on_smooth_timeout)
         
         # Set up widget properties
         self.setMinimumSize(200, 200)
@@ -42,53 +118,115 @@ class ImageWidget(QWidget):
         self.setMouseTracking(True)
         
     def set_image(self, image_path: str) -> None:
-        """Set the image to display"""
+        """Set the image to display, decoding it in the background if not cached"""
         if os.path.exists(image_path):
-            self.pixmap = QPixmap(image_path)
             self.image_path = image_path  # Store the path for reference
+            self._scaled_cache_key = None
+            
+            # Reuse the pixmap if this image was loaded before
+            pixmap = QPixmapCache.find(image_path)
+            if pixmap is not None and not pixmap.isNull():
+                self.pixmap = pixmap
+            else:
+                # Show nothing until the worker thread has decoded the image
+                self.pixmap = None
+                task = ImageLoadTask(image_path, self.MAX_PIXMAP_SIZE)
+                task.signals.loaded.connect(self.on_image_loaded)
+                QThreadPool.globalInstance().start(task)
             self.update()
         else:
-            print(f"Warning: Image not found at {image_path}")
+            log.warning("Image not found at %s", image_path)
+    
+    def on_image_loaded(self, image_path: str, image: QImage) -> None:
+        """Handle an image decoded by an ImageLoadTask"""
+        pixmap = QPixmap.fromImage(image)
+        QPixmapCache.insert(image_path, pixmap)
+        
+        # Ignore results for images that are no longer shown in this widget
+        if image_path == self.image_path:
+            self.pixmap = pixmap
+            self._scaled_cache_key = None
+            self.update()
     
     def set_metadata_text(self, text: str) -> None:
         """Set metadata text to display with the image"""
+        if text == self.metadata_text:
+            return
         self.metadata_text = text
         self.update()
     
     def toggle_metadata(self, show: bool) -> None:
         """Toggle metadata display"""
+        if show == self.show_metadata:
+            return
         self.show_metadata = show
         self.update()
     
     def add_bounding_box(self, rect: tuple, color: QColor = Qt.red, tooltip: str = None) -> None:
         """Add a bounding box to display on the image
         rect is (x1, y1, x2, y2) in normalized coordinates (0-1)
+        Boxes are clipped to the image; boxes outside it or with no area are ignored
         """
-        self.bounding_boxes.append(rect)
-        self.box_colors.append(color)
+        x1, y1, x2, y2 = rect
+        if x1 > 1 or x2 < 0 or y1 > 1 or y2 < 0:
+            return
+        
+        # Clamp to the image and skip degenerate boxes
+        x1, y1 = float(max(0, x1)), float(max(0, y1))
+        x2, y2 = float(min(1, x2)), float(min(1, y2))
+        if x2 - x1 <= 1e-6 or y2 - y1 <= 1e-6:
+            return
+        rect = (x1, y1, x2, y2)
+        
+        self.boxes.append((rect, color, tooltip))
         if tooltip:
-            self.box_tooltips.append((rect, tooltip))
+            # Register the tooltip in every grid cell the box overlaps
+            n = self.TOOLTIP_GRID_SIZE
+            for row in range(min(int(y1 * n), n - 1), min(int(y2 * n), n - 1) + 1):
+                for col in range(min(int(x1 * n), n - 1), min(int(x2 * n), n - 1) + 1):
+                    self.tooltip_grid[row * n + col].append((rect, tooltip))
+        self._box_pixel_groups = None
         self.update()
     
     def clear_bounding_boxes(self) -> None:
         """Clear all bounding boxes"""
-        self.bounding_boxes = []
-        self.box_colors = []
-        self.box_tooltips = []
+        self.boxes = []
+        self.tooltip_grid = [[] for _ in range(self.TOOLTIP_GRID_SIZE ** 2)]
+        self._box_pixel_groups = None
         self.update()
     
+    def reset(self) -> None:
+        """Return the widget to its blank state, keeping the grid-wide display options"""
+        self.pixmap = None
+        self.scaled_pixmap = None
+        self._scaled_cache_key = None
+        self.image_path = None  # Drop any image still loading in the background
+        self.metadata_text = ""
+        self.border_color = None
+        self.drawing = False
+        self.current_rect = None
+        self.tooltip_rect = None
+        self.tooltip_text = None
+        self.clear_bounding_boxes()
+    
     def set_border_color(self, color: QColor) -> None:
         """Set the border color for this image"""
+        if color == self.border_color:
+            return
         self.border_color = color
         self.update()
     
     def toggle_boxes(self, show: bool) -> None:
         """Toggle visibility of bounding boxes"""
+        if show == self.show_boxes:
+            return
         self.show_boxes = show
         self.update()
     
     def set_line_style(self, style: int) -> None:
         """Set line style for bounding boxes (Qt.SolidLine, Qt.DashLine, etc.)"""
+        if style == self.line_style:
+            return
         self.line_style = style
         self.update()
     
@@ -101,6 +239,17 @@ class ImageWidget(QWidget):
             self.current_rect = None
             self.update()
     
+    def resizeEvent(self, event):
+        """Use fast scaling while resizing and schedule a smooth re-render"""
+        super().resizeEvent(event)
+        self._use_fast = True
+        self._smooth_timer.start(150)
+    
+    def _on_smooth_timeout(self) -> None:
+        """Switch back to smooth scaling after resizing has stopped"""
+        self._use_fast = False
+        self.update()
+    
     def mousePressEvent(self, event):
         """Handle mouse press for drawing boxes"""
         if self.drawing_enabled and event.button() == Qt.LeftButton:
@@ -112,33 +261,61 @@ class ImageWidget(QWidget):
     def mouseMoveEvent(self, event):
         """Handle mouse move for drawing boxes and tooltips"""
         if self.drawing:
+            old_rect = self.current_rect
             self.current_rect = QRect(self.draw_start_pos, event.pos()).normalized()
-            self.update()
+            # Only repaint the area covered by the old and new rubber band
+            self.update(self.current_rect.united(old_rect).adjusted(-2, -2, 2, 2))
         else:
             # Check if mouse is over a bounding box for tooltip
             if self.pixmap and not self.pixmap.isNull() and self.scaled_pixmap:
                 # Get image position
-                x = (self.width() - self.scaled_pixmap.width()) / 2
-                y = (self.height() - self.scaled_pixmap.height()) / 2
+                x, y, width, height = self.image_geometry()
                 
                 # Convert mouse position to normalized coordinates
-                norm_x = (event.x() - x) / self.scaled_pixmap.width()
-                norm_y = (event.y() - y) / self.scaled_pixmap.height()
+                norm_x = (event.x() - x) / width
+                norm_y = (event.y() - y) / height
                 
-                # Check if mouse is over any bounding box
-                for i, (rect, tooltip) in enumerate(self.box_tooltips):
-                    x1, y1, x2, y2 = rect
-                    if x1 <= norm_x <= x2 and y1 <= norm_y <= y2:
-                        self.tooltip_rect = rect
-                        self.tooltip_text = tooltip
-                        self.update()
-                        return
+                # Check if mouse is over any bounding box in the grid cell under it
+                if 0 <= norm_x <= 1 and 0 <= norm_y <= 1:
+                    n = self.TOOLTIP_GRID_SIZE
+                    cell = min(int(norm_y * n), n - 1) * n + min(int(norm_x * n), n - 1)
+                    for rect, tooltip in self.tooltip_grid[cell]:
+                        x1, y1, x2, y2 = rect
+                        if x1 <= norm_x <= x2 and y1 <= norm_y <= y2:
+                            if rect != self.tooltip_rect or tooltip != self.tooltip_text:
+                                self.set_tooltip(rect, tooltip)
+                            return
                 
                 # Mouse not over any box
                 if self.tooltip_text:
-                    self.tooltip_text = None
-                    self.tooltip_rect = None
-                    self.update()
+                    self.set_tooltip(None, None)
+    
+    def set_tooltip(self, rect: tuple, text: str) -> None:
+        """Show the tooltip for a box, repainting only the old and new tooltip areas"""
+        if self.tooltip_text and self.tooltip_rect:
+            self.update(self.tooltip_area(self.tooltip_rect).adjusted(-1, -1, 1, 1))
+        self.tooltip_rect = rect
+        self.tooltip_text = text
+        if text and rect:
+            self.update(self.tooltip_area(rect).adjusted(-1, -1, 1, 1))
+    
+    def tooltip_area(self, rect: tuple) -> QRect:
+        """Get the widget rectangle covered by the tooltip of a normalized box"""
+        x, y, width, height = self.image_geometry()
+        x1, y1, x2, y2 = rect
+        
+        # Convert normalized coordinates to widget coordinates
+        box_x = int(x + x1 * width)
+        box_y = int(y + y1 * height)
+        return QRect(box_x, box_y - 30, 200, 30)
+    
+    def image_geometry(self) -> tuple:
+        """Get the (x, y, width, height) of the displayed image in widget coordinates"""
+        # The scaled pixmap holds device pixels; divide by its ratio for widget units
+        ratio = self.scaled_pixmap.devicePixelRatioF()
+        width = self.scaled_pixmap.width() / ratio
+        height = self.scaled_pixmap.height() / ratio
+        return (self.width() - width) / 2, (self.height() - height) / 2, width, height
     
     def mouseReleaseEvent(self, event):
         """Handle mouse release for drawing boxes"""
@@ -147,12 +324,13 @@ class ImageWidget(QWidget):
             
             # Convert to normalized coordinates
             if self.pixmap and not self.pixmap.isNull():
-                x1 = self.draw_start_pos.x() / self.width()
-                y1 = self.draw_start_pos.y() / self.height()
-                x2 = event.pos().x() / self.width()
-                y2 = event.pos().y() / self.height()
+                # Order the corners directly instead of normalizing a QRectF
+                x1, x2 = sorted((self.draw_start_pos.x(), event.pos().x()))
+                y1, y2 = sorted((self.draw_start_pos.y(), event.pos().y()))
+                width = self.width()
+                height = self.height()
                 
-                rect = QRectF(x1, y1, x2-x1, y2-y1).normalized()
+                rect = QRectF(x1 / width, y1 / height, (x2 - x1) / width, (y2 - y1) / height)
                 self.boxDrawn.emit(rect)
             
             self.current_rect = None
@@ -164,29 +342,38 @@ class ImageWidget(QWidget):
         painter.setRenderHint(QPainter.Antialiasing)
         painter.setRenderHint(QPainter.SmoothPixmapTransform)
         
+        # Only the damaged region needs to be redrawn
+        painter.setClipRect(event.rect())
+        
         # Draw background
         painter.fillRect(self.rect(), Qt.lightGray)  # Light gray background instead of white
         
         # Draw image if available
         if self.pixmap and not self.pixmap.isNull():
-            # Scale pixmap to fit widget while maintaining aspect ratio
-            self.scaled_pixmap = self.pixmap.scaled(
-                self.size(), 
-                Qt.KeepAspectRatio, 
-                Qt.SmoothTransformation
-            )
+            # Scale pixmap to fit widget while maintaining aspect ratio, at the
+            # resolution of the target device (HiDPI screen or export image),
+            # reusing the last result until the image or widget size changes
+            ratio = self.render_scale or self.devicePixelRatioF()
+            key = (self.pixmap.cacheKey(), self.width(), self.height(), ratio, self._use_fast)
+            if self.scaled_pixmap is None or key != self._scaled_cache_key:
+                self.scaled_pixmap = self.pixmap.scaled(
+                    self.size() * ratio, 
+                    Qt.KeepAspectRatio, 
+                    Qt.FastTransformation if self._use_fast else Qt.SmoothTransformation
+                )
+                self.scaled_pixmap.setDevicePixelRatio(ratio)
+                self._scaled_cache_key = key
             
             # Center the pixmap in the widget
-            x = (self.width() - self.scaled_pixmap.width()) / 2
-            y = (self.height() - self.scaled_pixmap.height()) / 2
+            x, y, width, height = self.image_geometry()
             
             # Draw border if specified
             if self.border_color:
                 border_rect = QRect(
                     int(x) - 3, 
                     int(y) - 3,
-                    self.scaled_pixmap.width() + 6,
-                    self.scaled_pixmap.height() + 6
+                    int(width) + 6,
+                    int(height) + 6
                 )
                 pen = QPen(self.border_color, 3)
                 painter.setPen(pen)
@@ -196,19 +383,29 @@ class ImageWidget(QWidget):
             painter.drawPixmap(int(x), int(y), self.scaled_pixmap)
             
             # Draw bounding boxes if enabled
-            if self.show_boxes and self.scaled_pixmap.width() > 0 and self.scaled_pixmap.height() > 0:
-                for rect, color in zip(self.bounding_boxes, self.box_colors):
-                    x1, y1, x2, y2 = rect
-                    
-                    # Convert normalized coordinates to widget coordinates
-                    box_x = int(x + x1 * self.scaled_pixmap.width())
-                    box_y = int(y + y1 * self.scaled_pixmap.height())
-                    box_w = int((x2 - x1) * self.scaled_pixmap.width())
-                    box_h = int((y2 - y1) * self.scaled_pixmap.height())
-                    
+            if self.show_boxes and width > 0 and height > 0:
+                # Convert normalized coordinates to widget coordinates, grouped
+                # by color, only when the boxes or the image geometry have changed
+                box_key = (x, y, width, height)
+                if self._box_pixel_groups is None or box_key != self._box_pixel_key:
+                    groups = {}
+                    for (x1, y1, x2, y2), color, _ in self.boxes:
+                        box_rect = QRect(
+                            int(x + x1 * width),
+                            int(y + y1 * height),
+                            int((x2 - x1) * width),
+                            int((y2 - y1) * height)
+                        )
+                        color = QColor(color)
+                        groups.setdefault(color.rgba(), (color, []))[1].append(box_rect)
+                    self._box_pixel_groups = list(groups.values())
+                    self._box_pixel_key = box_key
+                
+                # One pen change and one draw call per color
+                for color, box_rects in self._box_pixel_groups:
                     pen = QPen(color, 2, self.line_style)
                     painter.setPen(pen)
-                    painter.drawRect(box_x, box_y, box_w, box_h)
+                    painter.drawRects(box_rects)
             
             # Draw current rectangle if in drawing mode
             if self.current_rect:
@@ -217,14 +414,8 @@ class ImageWidget(QWidget):
                 
             # Draw tooltip if needed
             if self.tooltip_text and self.tooltip_rect:
-                x1, y1, x2, y2 = self.tooltip_rect
-                
-                # Convert normalized coordinates to widget coordinates
-                box_x = int(x + x1 * self.scaled_pixmap.width())
-                box_y = int(y + y1 * self.scaled_pixmap.height())
-                
                 # Draw tooltip background
-                tooltip_rect = QRect(box_x, box_y - 30, 200, 30)
+                tooltip_rect = self.tooltip_area(self.tooltip_rect)
                 painter.fillRect(tooltip_rect, QColor(255, 255, 220, 230))  # Light yellow background
                 painter.setPen(QPen(Qt.black))
                 painter.drawRect(tooltip_rect)
@@ -316,35 +507,47 @@ class ImageGridView(QWidget):
         # Initialize with default 2x2 grid
         self.rows = 2
         self.cols = 2
-        self.image_widgets = []
+        self.widget_pool = []    # All ImageWidgets created so far, displayed or not
+        self.image_widgets = []  # Widgets currently displayed in the grid
         self.setup_grid()
     
     def setup_grid(self) -> None:
-        """Set up the grid layout with image widgets"""
-        # Clear existing grid
-        for widget in self.image_widgets:
-            widget.setParent(None)
-        
-        # Clear layout
-        while self.grid_layout.count():
-            item = self.grid_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+        """Set up the grid layout with image widgets, reusing existing widgets"""
+        # Detach existing widgets; they are re-added at their new positions
+        for widget in self.widget_pool:
+            self.grid_layout.removeWidget(widget)
         
         # Set small spacing between images
         self.grid_layout.setSpacing(5)  # 5 pixel spacing between grid items
         
-        self.image_widgets = []
-        
-        # Create new grid of ImageWidget instances
-        for row in range(self.rows):
-            for col in range(self.cols):
-                image_widget = ImageWidget()
-                self.grid_layout.addWidget(image_widget, row, col)
-                self.image_widgets.append(image_widget)
-                
-                # Connect box drawing signal
-                image_widget.boxDrawn.connect(lambda rect, r=row, c=col: self.on_box_drawn(rect, r, c))
+        # Only create the ImageWidget instances that are missing
+        needed = self.rows * self.cols
+        while len(self.widget_pool) < needed:
+            image_widget = ImageWidget()
+            self.widget_pool.append(image_widget)
+            
+            # Connect box drawing signal
+            image_widget.boxDrawn.connect(
+                lambda rect, w=image_widget: self.on_box_drawn(rect, *self.widget_position(w)))
+        
+        # Start from a blank grid, as a freshly built one would be; reloading
+        # an image afterwards is cheap because its pixmap stays in QPixmapCache
+        for image_widget in self.widget_pool:
+            image_widget.reset()
+        
+        self.image_widgets = self.widget_pool[:needed]
+        for index, image_widget in enumerate(self.image_widgets):
+            row, col = divmod(index, self.cols)
+            self.grid_layout.addWidget(image_widget, row, col)
+            image_widget.show()
+        
+        # Hide surplus widgets so they can be reused later
+        for image_widget in self.widget_pool[needed:]:
+            image_widget.hide()
+    
+    def widget_position(self, widget: ImageWidget) -> tuple:
+        """Get the (row, col) grid position of a displayed image widget"""
+        return divmod(self.image_widgets.index(widget), self.cols)
     
     def on_grid_size_changed(self, index: int) -> None:
         """Handle grid size change"""
@@ -362,19 +565,23 @@ class ImageGridView(QWidget):
     
     def set_images_from_collection(self, collection):
         """Set images using a collection object"""
-        # Sort images by magnification
-        sorted_images = sorted(collection.images, 
-                             key=lambda x: collection.metadata[x].get("Mag(pol)", 0))
-        
-        # Limit to the number of grid cells available
-        display_images = sorted_images[:len(self.image_widgets)]
-        
-        # Prepare image paths and metadata texts
-        image_paths = display_images
-        metadata_texts = [
-            f"Mag: {collection.metadata[img].get('Mag(pol)', 0)}x | {os.path.basename(img)}"
-            for img in display_images
-        ]
+        # Sort images by magnification, looking each one up only once
+        sorted_images = sorted(
+            ((collection.metadata[img].get("Mag(pol)", 0), img) for img in collection.images),
+            key=lambda pair: pair[0]
+        )
+
+        # Prepare image paths and metadata texts in a single pass,
+        # limited to the number of grid cells available
+        image_paths = []
+        metadata_texts = []
+        for mag, img in sorted_images[:len(self.image_widgets)]:
+            image_paths.append(img)
+            metadata_texts.append(f"Mag: {mag}x | {os.path.basename(img)}")
+        display_images = image_paths
+        
+        # Map each displayed image to its grid index for constant-time lookups
+        display_index = {img: i for i, img in enumerate(display_images)}
         
         # Set images in grid
         self.set_images(image_paths, metadata_texts)
@@ -382,30 +589,31 @@ class ImageGridView(QWidget):
         # Clear any existing bounding boxes
         self.clear_all_bounding_boxes()
         
-        # Add bounding boxes based on collection containment relationships
-        for i, img_path in enumerate(display_images):
-            # Check if this image contains others
-            if img_path in collection.containment:
-                for child_img in collection.containment[img_path]:
-                    if child_img in display_images:
-                        child_idx = display_images.index(child_img)
-                        
-                        # Get bounding box
-                        bbox = collection.bounding_boxes.get((img_path, child_img))
-                        if bbox:
-                            # Get color
-                            color_rgba = collection.colors.get(child_img)
-                            if color_rgba:
-                                color = QColor(*color_rgba)
-                            else:
-                                color = QColor(255, 0, 0, 180)  # Default red
-                            
-                            # Add box to parent image
-                            tooltip = f"{os.path.basename(child_img)}\n{collection.metadata[child_img].get('Mag(pol)', 0)}x"
-                            self.add_bounding_box(i, bbox, color, tooltip)
-                            
-                            # Add colored border to child image
-                            self.set_border_color(child_idx, color)
+        # Collect containment edges between displayed images in one pass:
+        # (parent index, child index, child path, bounding box)
+        edges = [
+            (i, display_index[child_img], child_img, collection.bounding_boxes[(img_path, child_img)])
+            for i, img_path in enumerate(display_images)
+            for child_img in collection.containment.get(img_path, ())
+            if child_img in display_index and collection.bounding_boxes.get((img_path, child_img))
+        ]
+        
+        # Add bounding boxes based on collection containment relationships,
+        # creating one QColor per distinct RGBA value
+        color_cache = {}
+        for parent_idx, child_idx, child_img, bbox in edges:
+            # Get color
+            color_rgba = tuple(collection.colors.get(child_img) or (255, 0, 0, 180))  # Default red
+            color = color_cache.get(color_rgba)
+            if color is None:
+                color = color_cache[color_rgba] = QColor(*color_rgba)
+            
+            # Add box to parent image
+            tooltip = f"{os.path.basename(child_img)}\n{collection.metadata[child_img].get('Mag(pol)', 0)}x"
+            self.add_bounding_box(parent_idx, bbox, color, tooltip)
+            
+            # Add colored border to child image
+            self.set_border_color(child_idx, color)
     
     def add_bounding_box(self, widget_index: int, rect: tuple, color: QColor = Qt.red, tooltip: str = None) -> None:
         """Add a bounding box to a specific image widget"""
@@ -425,40 +633,73 @@ class ImageGridView(QWidget):
     def toggle_boxes(self, state: int) -> None:
         """Toggle bounding box visibility for all widgets"""
         show = state == Qt.Checked
-        for widget in self.image_widgets:
+        for widget in self.widget_pool:
             widget.toggle_boxes(show)
     
     def set_line_style(self, style: int) -> None:
         """Set line style for all bounding boxes"""
-        for widget in self.image_widgets:
+        for widget in self.widget_pool:
             widget.set_line_style(style)
     
     def on_box_drawn(self, rect: QRectF, row: int, col: int) -> None:
         """Handle box drawn signal from an image widget"""
         # This will be connected to the controller
-        print(f"Box drawn at row {row}, col {col}: {rect.x():.2f}, {rect.y():.2f}, {rect.width():.2f}, {rect.height():.2f}")
+        log.debug("Box drawn at row %s, col %s: %.2f, %.2f, %.2f, %.2f",
+                  row, col, rect.x(), rect.y(), rect.width(), rect.height())
     
     def clear_all(self) -> None:
         """Clear all images"""
         for widget in self.image_widgets:
             widget.pixmap = None
             widget.scaled_pixmap = None
+            widget.image_path = None  # Drop any image still loading in the background
             widget.clear_bounding_boxes()
             widget.update()
     
-    def export_grid(self, file_path: str) -> bool:
-        """Export the current grid as a PNG image"""
+    def export_grid(self, file_path: str, scale: float = None) -> bool:
+        """Export the current grid as a PNG image
+        
+        Args:
+            file_path: Path of the PNG file to write
+            scale: Output pixels per on-screen pixel; defaults to the screen's
+                device pixel ratio, so HiDPI displays export at full resolution
+        """
+        if scale is None:
+            scale = self.grid_container.devicePixelRatioF()
+        
         try:
-            # Create a pixmap to render the entire grid
-            pixmap = QPixmap(self.grid_container.size())
-            pixmap.fill(Qt.white)
+            # Create an image to render the entire grid into, using the
+            # premultiplied format QPainter is optimized for. The grid is laid
+            # out in screen units and the device pixel ratio maps it to pixels
+            image = QImage(self.grid_container.size() * scale, QImage.Format_ARGB32_Premultiplied)
+            image.setDevicePixelRatio(scale)
+            image.fill(Qt.white)
+            
+            # Images are decoded in the background; decode any that are still
+            # pending now, so they are not exported as placeholders
+            for widget in self.image_widgets:
+                if widget.image_path and widget.pixmap is None:
+                    decoded = ImageLoadTask.decode(widget.image_path, widget.MAX_PIXMAP_SIZE)
+                    if not decoded.isNull():
+                        widget.on_image_loaded(widget.image_path, decoded)
+            
+            # Have the images scaled from their source pixmaps at the export
+            # resolution, rather than upscaling what is shown on screen
+            for widget in self.image_widgets:
+                widget.render_scale = scale
             
-            # Render the grid container to the pixmap
-            self.grid_container.render(pixmap)
+            # Render the grid container to the image
+            painter = QPainter(image)
+            try:
+                self.grid_container.render(painter)
+            finally:
+                painter.end()
+                for widget in self.image_widgets:
+                    widget.render_scale = None
             
-            # Save the pixmap as PNG
-            pixmap.save(file_path, "PNG")
+            # Save the image as PNG
+            image.save(file_path, "PNG")
             return True
         except Exception as e:
-            print(f"Error exporting grid: {e}")
+            log.error("Error exporting grid: %s", e)
             return False
@@ -1,13 +1,20 @@
 import sys
 import os
+import logging
+
+# Only warnings and errors are shown unless the level is lowered for debugging
+logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+log = logging.getLogger(__name__)
 
 try:
     from PyQt5.QtWidgets import QApplication, QMessageBox
-    print("Successfully imported PyQt5")
+    from PyQt5.QtGui import QPixmapCache
+    from PyQt5.QtCore import Qt
+    log.debug("Successfully imported PyQt5")
 except ImportError as e:
-    print(f"Error importing PyQt5: {e}")
-    print(f"Python path: {sys.path}")
-    print(f"Python executable: {sys.executable}")
+    log.error("Error importing PyQt5: %s", e)
+    log.error("Python path: %s", sys.path)
+    log.error("Python executable: %s", sys.executable)
     sys.exit(1)
 
 # Add the current directory to sys.path to ensure all modules can be imported
@@ -15,31 +22,21 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(script_dir)
 
 def main():
+    # Enable high-DPI scaling and pixmaps; must be set before the application is created
+    QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
+    QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
+    
     # Create the application
     app = QApplication(sys.argv)
     app.setApplicationName("ScaleGrid")
     app.setStyle("Fusion")  # Use Fusion style for consistent cross-platform look
+    
+    # Allow loaded SEM images to stay cached between grid rebuilds (limit in KB)
+    QPixmapCache.setCacheLimit(256 * 1024)
 
     try:
-        # First check that all modules can be imported without errors
-        required_modules = [
-            "main_window",
-            "image_grid",
-            "metadata",
-            "image_collections", 
-            "sample_dialog",
-            "controller"
-        ]
-        
-        for module_name in required_modules:
-            try:
-                __import__(module_name)
-                print(f"Successfully imported {module_name}")
-            except ImportError as e:
-                print(f"Error importing {module_name}: {e}")
-                raise
-        
-        # Import our controller
+        # Import our controller; this imports every other module and
+        # surfaces any ImportError through the handler below
         from controller import ScaleGridController
         
         # Create and run the controller
@@ -48,9 +45,8 @@ def main():
         
     except Exception as e:
         error_msg = f"An error occurred while starting the application: {str(e)}"
-        print(error_msg)
         import traceback
-        traceback.print_exc()
+        log.exception(error_msg)
         
         # Show error dialog
         try:
@@ -62,7 +58,7 @@ def main():
             msg_box.exec_()
         except:
             # If even the QMessageBox fails, print to console only
-            print("Could not display error dialog")
+            log.error("Could not display error dialog")
         
         sys.exit(1)
     
@@ -1,6 +1,5 @@
 from PyQt5.QtWidgets import (QMainWindow, QVBoxLayout, QHBoxLayout, QLabel, 
                             QPushButton, QWidget, QStatusBar, QMessageBox)
-from PyQt5.QtCore import Qt
 
 from image_grid import ImageGridView
 
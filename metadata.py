@@ -1,14 +1,221 @@
+import io
 import os
+import sys
 import csv
 import json
-import xml.etree.ElementTree as ET
+import multiprocessing
 from typing import Dict, List, Optional, Any
-from datetime import datetime
-from PIL import Image
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+# Characters other than digits and whitespace that int() or float() accept first
+NUMERIC_PREFIXES = frozenset("+-.")
+
+# Text columns that hold only a handful of distinct values across a session;
+# these are interned on load so every row shares one string object per value
+INTERNED_FIELDS = ("detector", "session_id", "sample_id")
+
+# Batches smaller than this are extracted in-process; below it, starting the
+# worker processes takes longer than reading the TIFF headers serially
+PARALLEL_EXTRACT_MIN_FILES = 32
+
+# Buffer size for reading metadata CSV files, so large sessions are read
+# with a few large system calls instead of many 8 KiB ones
+CSV_BUFFER_SIZE = 1 << 20  # 1 MiB
+
+
+# The readers below are cached on (path, mtime_ns, size), so a file that
+# changes on disk is parsed again; the save methods also clear them, since a
+# rewrite can land within the filesystem's timestamp resolution. Results are
+# shared between calls and must be copied before they are modified.
+
+@lru_cache(maxsize=32)
+def _read_session_info_json(file_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """Parse a session info JSON file"""
+    with open(file_path, 'r') as f:
+        return json.loads(f.read())
+
+
+@lru_cache(maxsize=32)
+def _read_images_metadata_csv(file_path: str, mtime_ns: int, size: int) -> Dict[str, Dict]:
+    """Parse a metadata CSV file into a dictionary mapping image paths to their metadata"""
+    image_metadata = {}
+    
+    with open(file_path, 'r', newline='', buffering=CSV_BUFFER_SIZE) as csvfile:
+        reader = csv.DictReader(csvfile)
+        
+        for row in reader:
+            # Use the image_path as the key
+            if "image_path" in row and row["image_path"]:
+                image_path = row["image_path"]
+                
+                # Convert numeric fields from strings
+                for key, value in row.items():
+                    if value == "":
+                        continue
+                    
+                    # Values that cannot start a number are kept as strings
+                    # without paying for a failed int()/float() call
+                    first = value[0]
+                    if not (first.isdigit() or first in NUMERIC_PREFIXES or first.isspace()):
+                        continue
+                        
+                    # Try to convert to appropriate type
+                    try:
+                        if "." in value:
+                            row[key] = float(value)
+                        else:
+                            row[key] = int(value)
+                    except ValueError:
+                        # Keep as string if conversion fails
+                        pass
+                
+                for key in INTERNED_FIELDS:
+                    value = row.get(key)
+                    if isinstance(value, str):
+                        row[key] = sys.intern(value)
+                
+                image_metadata[image_path] = row
+    
+    return image_metadata
+
+
+def extract_metadata_from_tiff(tiff_path: str) -> Dict:
+    """
+    Extracts and parses the XML metadata embedded in a TIFF image.
+
+    Args:
+        tiff_path (str): Path to the TIFF file.
+
+    Returns:
+        dict: Extracted metadata as a dictionary.
+    """
+    try:
+        # Pillow and the XML parser are only needed here, so they are imported
+        # on first use rather than when the module is loaded (inside the try,
+        # so a missing Pillow is reported like any other failure)
+        import xml.etree.ElementTree as ET
+        from PIL import Image, TiffImagePlugin  # TiffImagePlugin registers the TIFF opener
+
+        # Size and modification time identify this version of the file, so
+        # saved metadata can be reused until the image changes on disk
+        stat = os.stat(tiff_path)
+
+        # Open the TIFF file using Pillow. This only reads the header and
+        # first IFD; restricting it to the TIFF plugin skips probing (and
+        # importing) every other image format Pillow supports
+        with Image.open(tiff_path, formats=["TIFF"]) as img:
+            # TIFF images may store metadata in their "info" dictionary
+            xml_data = img.tag_v2.get(34683)  # 34683 is the TIFF tag for Phenom XML metadata
+
+            if not xml_data:
+                print(f"No XML metadata found in {tiff_path}")
+                return {}
+
+            # Convert bytes to string if necessary
+            if isinstance(xml_data, bytes):
+                xml_data = xml_data.decode("utf-8")
+
+            # Parse the XML
+            root = ET.fromstring(xml_data)
+
+            # Index the top-level elements in a single pass (keeping the first
+            # of any repeated tag, like find() does) and look up the nested
+            # groups once, instead of searching from the root for every field
+            elements = {}
+            for child in root:
+                elements.setdefault(child.tag, child)
+            crop_hint = elements["cropHint"]
+            sample_position = elements["samplePosition"]
+            scan = elements["acquisition"].find("scan")
+
+            width_pix = int(crop_hint.find("right").text) # in pixels
+            height_pix = int(crop_hint.find("bottom").text) #in pixels
+            pixel_dim_nm = float(elements["pixelWidth"].text)  # in nm
+            field_of_view_width = pixel_dim_nm*width_pix/1000 # in um
+            field_of_view_height = pixel_dim_nm*height_pix/1000 # in um
+            mag_pol = int(127000/field_of_view_width)
+
+            multi_stage = elements.get("multiStage")
+
+            multi_stage_x = None
+            multi_stage_y = None
+            beam_shift_x = None
+            beam_shift_y = None
+
+            if multi_stage:
+                for axis in multi_stage.findall("axis"):
+                    if axis.get("id") == "X":
+                        multi_stage_x = float(axis.text)
+                    elif axis.get("id") == "Y":
+                        multi_stage_y = float(axis.text)
+
+            beam_shift = scan.find("beamShift")
+            if beam_shift is not None:
+                beam_shift_x = float(beam_shift.find("x").text)
+                beam_shift_y = float(beam_shift.find("y").text)
+            else:
+                beam_shift_x = None
+                beam_shift_y = None
+
+            # Extract required metadata
+            data = {
+                "databarLabel": root.findtext("databarLabel"),
+                "time": root.findtext("time"),
+                "pixels_width": width_pix,
+                "pixels_height": height_pix,
+                "pixel_dimension_nm": pixel_dim_nm,  # assuming square pixels
+                "field_of_view_width": field_of_view_width,
+                "field_of_view_height": field_of_view_height, 
+                "Mag(pol)": mag_pol,  # Keep this key for compatibility
+                "mag_pol": mag_pol, 
+                "sample_position_x": float(sample_position.find("x").text), # in um
+                "sample_position_y": float(sample_position.find("y").text), # in um
+                "multistage_X": multi_stage_x,
+                "multistage_Y": multi_stage_y,
+                "beam_shift_x": beam_shift_x,
+                "beam_shift_y": beam_shift_y,
+                "spot_size": float(scan.find("spotSize").text),
+                "detector": scan.find("detector").text,
+                "dwell_time_ns": int(scan.find("dwellTime").text),
+                "contrast": float(elements["appliedContrast"].text),
+                "gamma": float(elements["appliedGamma"].text),
+                "brightness": float(elements["appliedBrightness"].text),
+                "pressure_Pa": float(elements["samplePressureEstimate"].text),
+                "high_voltage_kV": float(scan.find("highVoltage").text) / 1000,  # Convert to kV
+                "emission_current_uA": float(scan.find("emissionCurrent").text),
+                "working_distance_mm": float(elements["workingDistance"].text)
+            }
+
+            # Add stage_x and stage_y for compatibility with existing code
+            data["stage_x"] = data["sample_position_x"]
+            data["stage_y"] = data["sample_position_y"]
+
+            # Add hfw and hfh for compatibility with existing code
+            data["hfw"] = data["field_of_view_width"]
+            data["hfh"] = data["field_of_view_height"]
+
+            data["file_size"] = stat.st_size
+            data["file_mtime_ns"] = stat.st_mtime_ns
+
+            return data
+    except Exception as e:
+        print(f"Error in extract_metadata_from_tiff for {tiff_path}: {e}")
+        import traceback
+        traceback.print_exc()
+        return {}
+
 
 class MetadataManager:
     """Class to manage metadata storage and retrieval for SEM samples"""
     
+    # Position of the important CSV columns, which are written first in this order
+    PRIORITY_RANK = {field: rank for rank, field in enumerate([
+        "image_path", "databarLabel", "Mag(pol)", "field_of_view_width",
+        "field_of_view_height", "sample_position_x", "sample_position_y",
+        "detector", "high_voltage_kV", "working_distance_mm"
+    ])}
+    
     def __init__(self, base_dir: str = "."):
         """
         Initialize the metadata manager
@@ -43,12 +250,18 @@ class MetadataManager:
         
         # Add timestamp if not present
         if "timestamp" not in session_info:
+            from datetime import datetime
             session_info["timestamp"] = datetime.now().isoformat()
         
         file_path = self.get_session_info_path(session_info["session_id"])
         
+        # Serialize in one call and write once; json.dump would issue a
+        # separate write for every chunk the encoder produces
+        data = json.dumps(session_info, indent=2)
         with open(file_path, 'w') as f:
-            json.dump(session_info, f, indent=2)
+            f.write(data)
+        
+        _read_session_info_json.cache_clear()
         
         return file_path
     
@@ -68,8 +281,8 @@ class MetadataManager:
             return None
         
         try:
-            with open(file_path, 'r') as f:
-                return json.load(f)
+            stat = os.stat(file_path)
+            return dict(_read_session_info_json(file_path, stat.st_mtime_ns, stat.st_size))
         except Exception as e:
             print(f"Error loading session info for {session_id}: {e}")
             return None
@@ -88,28 +301,34 @@ class MetadataManager:
         file_path = self.get_metadata_csv_path(session_id)
         
         # Extract all possible field names from all metadata dictionaries
-        fieldnames = set()
+        # (image_path is always written, see below)
+        fieldnames = {"image_path"}
         for metadata in image_metadata.values():
             fieldnames.update(metadata.keys())
         
         # Sort fieldnames for consistency, but ensure some important fields come first
-        priority_fields = ["image_path", "databarLabel", "Mag(pol)", "field_of_view_width", 
-                         "field_of_view_height", "sample_position_x", "sample_position_y",
-                         "detector", "high_voltage_kV", "working_distance_mm"]
+        last_rank = len(self.PRIORITY_RANK)
+        sorted_fieldnames = sorted(fieldnames, key=lambda f: (self.PRIORITY_RANK.get(f, last_rank), f))
+        
+        # Plain row lists for one writerows call; image_path ranks first and
+        # falls back to the dict key without copying the row
+        other_fieldnames = sorted_fieldnames[1:]
+        rows = []
+        for image_path, metadata in image_metadata.items():
+            row = [metadata.get("image_path", image_path)]
+            row.extend([metadata.get(field, "") for field in other_fieldnames])
+            rows.append(row)
         
-        sorted_fieldnames = [f for f in priority_fields if f in fieldnames]
-        sorted_fieldnames.extend([f for f in sorted(fieldnames) if f not in priority_fields])
+        # Format the whole file in memory and write it with a single call
+        buffer = io.StringIO(newline='')
+        writer = csv.writer(buffer)
+        writer.writerow(sorted_fieldnames)
+        writer.writerows(rows)
         
         with open(file_path, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=sorted_fieldnames)
-            writer.writeheader()
-            
-            for image_path, metadata in image_metadata.items():
-                # Add image_path to metadata if not already there
-                row_data = metadata.copy()
-                if "image_path" not in row_data:
-                    row_data["image_path"] = image_path
-                writer.writerow(row_data)
+            csvfile.write(buffer.getvalue())
+        
+        _read_images_metadata_csv.cache_clear()
         
         return file_path
     
@@ -129,34 +348,10 @@ class MetadataManager:
             return {}
         
         try:
-            image_metadata = {}
-            
-            with open(file_path, 'r', newline='') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    # Use the image_path as the key
-                    if "image_path" in row and row["image_path"]:
-                        image_path = row["image_path"]
-                        
-                        # Convert numeric fields from strings
-                        for key, value in row.items():
-                            if value == "":
-                                continue
-                                
-                            # Try to convert to appropriate type
-                            try:
-                                if "." in value:
-                                    row[key] = float(value)
-                                else:
-                                    row[key] = int(value)
-                            except ValueError:
-                                # Keep as string if conversion fails
-                                pass
-                        
-                        image_metadata[image_path] = row
-            
-            return image_metadata
+            stat = os.stat(file_path)
+            image_metadata = _read_images_metadata_csv(file_path, stat.st_mtime_ns, stat.st_size)
+            # The cached rows only hold scalars, so a shallow copy is enough
+            return {image_path: dict(row) for image_path, row in image_metadata.items()}
             
         except Exception as e:
             print(f"Error loading metadata CSV for {session_id}: {e}")
@@ -200,92 +395,58 @@ class MetadataManager:
         Returns:
             dict: Extracted metadata as a dictionary.
         """
-        try:
-            # Open the TIFF file using Pillow
-            with Image.open(tiff_path) as img:
-                # TIFF images may store metadata in their "info" dictionary
-                xml_data = img.tag_v2.get(34683)  # 34683 is the TIFF tag for Phenom XML metadata
-                
-                if not xml_data:
-                    print(f"No XML metadata found in {tiff_path}")
-                    return {}
-                
-                # Convert bytes to string if necessary
-                if isinstance(xml_data, bytes):
-                    xml_data = xml_data.decode("utf-8")
-
-                # Parse the XML
-                root = ET.fromstring(xml_data)
-
-                width_pix = int(root.find("cropHint/right").text) # in pixels
-                height_pix = int(root.find("cropHint/bottom").text) #in pixels
-                pixel_dim_nm = float(root.find("pixelWidth").text)  # in nm
-                field_of_view_width = pixel_dim_nm*width_pix/1000 # in um
-                field_of_view_height = pixel_dim_nm*height_pix/1000 # in um
-                mag_pol = int(127000/field_of_view_width)
-
-                multi_stage = root.find("multiStage")
-                
-                multi_stage_x = None
-                multi_stage_y = None
-                beam_shift_x = None
-                beam_shift_y = None
-
-                if multi_stage:
-                    for axis in multi_stage.findall("axis"):
-                        if axis.get("id") == "X":
-                            multi_stage_x = float(axis.text)
-                        elif axis.get("id") == "Y":
-                            multi_stage_y = float(axis.text)
-
-                beam_shift = root.find("acquisition/scan/beamShift")
-                if beam_shift is not None:
-                    beam_shift_x = float(beam_shift.find("x").text)
-                    beam_shift_y = float(beam_shift.find("y").text)
-                else:
-                    beam_shift_x = None
-                    beam_shift_y = None
-
-                # Extract required metadata
-                data = {
-                    "databarLabel": root.findtext("databarLabel"),
-                    "time": root.findtext("time"),
-                    "pixels_width": width_pix,
-                    "pixels_height": height_pix,
-                    "pixel_dimension_nm": pixel_dim_nm,  # assuming square pixels
-                    "field_of_view_width": field_of_view_width,
-                    "field_of_view_height": field_of_view_height, 
-                    "Mag(pol)": mag_pol,  # Keep this key for compatibility
-                    "mag_pol": mag_pol, 
-                    "sample_position_x": float(root.find("samplePosition/x").text), # in um
-                    "sample_position_y": float(root.find("samplePosition/y").text), # in um
-                    "multistage_X": multi_stage_x,
-                    "multistage_Y": multi_stage_y,
-                    "beam_shift_x": beam_shift_x,
-                    "beam_shift_y": beam_shift_y,
-                    "spot_size": float(root.find("acquisition/scan/spotSize").text),
-                    "detector": root.find("acquisition/scan/detector").text,
-                    "dwell_time_ns": int(root.find("acquisition/scan/dwellTime").text),
-                    "contrast": float(root.find("appliedContrast").text),
-                    "gamma": float(root.find("appliedGamma").text),
-                    "brightness": float(root.find("appliedBrightness").text),
-                    "pressure_Pa": float(root.find("samplePressureEstimate").text),
-                    "high_voltage_kV": float(root.find("acquisition/scan/highVoltage").text) / 1000,  # Convert to kV
-                    "emission_current_uA": float(root.find("acquisition/scan/emissionCurrent").text),
-                    "working_distance_mm": float(root.find("workingDistance").text)
-                }
-                
-                # Add stage_x and stage_y for compatibility with existing code
-                data["stage_x"] = data["sample_position_x"]
-                data["stage_y"] = data["sample_position_y"]
-                
-                # Add hfw and hfh for compatibility with existing code
-                data["hfw"] = data["field_of_view_width"]
-                data["hfh"] = data["field_of_view_height"]
-                
-                return data
-        except Exception as e:
-            print(f"Error in extract_metadata_from_tiff for {tiff_path}: {e}")
-            import traceback
-            traceback.print_exc()
-            return {}
+        return extract_metadata_from_tiff(tiff_path)
+    
+    def extract_metadata_batch(self, tiff_paths: List[str],
+                               known_metadata: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+        """
+        Extract metadata from many TIFF images in parallel worker processes
+        
+        Args:
+            tiff_paths: Paths to the TIFF files
+            known_metadata: Previously saved metadata (e.g. from the session CSV);
+                entries whose file_size and file_mtime_ns still match the file
+                on disk are copied into the result instead of opening the TIFF again
+            
+        Returns:
+            Dictionary mapping image paths to their metadata, in the order given,
+            leaving out images whose metadata could not be extracted
+        """
+        known_metadata = known_metadata or {}
+        image_metadata = {}
+        stale_paths = []
+        
+        for path in tiff_paths:
+            metadata = known_metadata.get(path)
+            if metadata:
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    stat = None
+                if (stat is not None
+                        and metadata.get("file_size") == stat.st_size
+                        and metadata.get("file_mtime_ns") == stat.st_mtime_ns):
+                    # Copy so callers can modify the result without
+                    # changing the known_metadata they passed in
+                    image_metadata[path] = dict(metadata)
+                    continue
+            stale_paths.append(path)
+        
+        if len(stale_paths) < PARALLEL_EXTRACT_MIN_FILES:
+            # Starting worker processes costs more than parsing a few XML tags
+            for path in stale_paths:
+                image_metadata[path] = extract_metadata_from_tiff(path)
+        else:
+            # Hand each worker several files at a time to amortize the
+            # inter-process overhead, while still spreading work over all cores
+            workers = min(os.cpu_count() or 1, len(stale_paths))
+            chunksize = max(1, len(stale_paths) // (workers * 4))
+            
+            # Always spawn fresh workers: forking the GUI process, which already
+            # runs QThreadPool threads, can deadlock in the child
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                results = executor.map(extract_metadata_from_tiff, stale_paths, chunksize=chunksize)
+                image_metadata.update(zip(stale_paths, results))
+        
+        return {path: image_metadata[path] for path in tiff_paths if image_metadata.get(path)}
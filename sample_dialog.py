@@ -1,12 +1,13 @@
-from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, 
-                            QTextEdit, QPushButton, QDialogButtonBox, QFileDialog,
-                            QFormLayout, QGroupBox, QComboBox, QCheckBox)
-from PyQt5.QtCore import Qt
-from typing import Dict, Optional
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QLabel, QLineEdit, QTextEdit,
+                            QDialogButtonBox, QFormLayout, QComboBox, QCheckBox)
+from typing import Dict
 
 class SampleInfoDialog(QDialog):
     """Enhanced dialog to collect detailed sample information from the user"""
     
+    # Choices for the sample preparation method dropdown ("" means not specified)
+    PREP_METHODS = ("", "Dust", "Flick", "Dish", "Chunk")
+    
     def __init__(self, parent=None, session_id: str = "", existing_info: Dict = None):
         super().__init__(parent)
         self.setWindowTitle("Sample Information")
@@ -36,8 +37,7 @@ class SampleInfoDialog(QDialog):
         
         # Sample preparation method dropdown
         self.prep_method_combo = QComboBox()
-        prep_methods = ["", "Dust", "Flick", "Dish", "Chunk"]
-        self.prep_method_combo.addItems(prep_methods)
+        self.prep_method_combo.addItems(self.PREP_METHODS)
         if existing_info and "preparation_method" in existing_info:
             index = self.prep_method_combo.findText(existing_info["preparation_method"])
             if index >= 0: